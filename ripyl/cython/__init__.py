@@ -59,6 +59,14 @@ def monkeypatch_modules(modules, lib_base):
     patched_objs = []
     for mname, module in modules.iteritems():
         py_mname = '.'.join((lib_base, mname))
+        if py_mname not in sys.modules:
+            # Modules such as the protocol decoders aren't loaded with the base library.
+            # Import them now so that they can be patched.
+            try:
+                importlib.import_module(py_mname)
+            except ImportError:
+                continue
+
         if py_mname in sys.modules:
             objs = inspect.getmembers(module, inspect.isbuiltin)
             classes = inspect.getmembers(module, inspect.isclass)
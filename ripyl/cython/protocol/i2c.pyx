@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# cython: boundscheck=False
+# cython: wraparound=False
+
+'''Cython implementation of protocol/i2c.py functions
+'''
+
+# Copyright © 2013 Kevin Thibedeau
+
+# This file is part of Ripyl.
+
+# Ripyl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+
+# Ripyl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with Ripyl. If not, see <http://www.gnu.org/licenses/>.
+
+cimport cython
+import numpy as np
+
+# These must match the constants in ripyl/protocol/i2c.py
+cdef int S_IDLE = 0
+cdef int S_ADDR = 1
+cdef int S_ADDR_10B = 2
+cdef int S_DATA = 3
+
+cdef int I2C_START = 0
+cdef int I2C_RESTART = 1
+cdef int I2C_STOP = 2
+cdef int I2C_ADDR = 3
+cdef int I2C_ADDR_10B = 4
+cdef int I2C_DATA = 5
+
+cdef int EV_CLOCK = 0
+cdef int EV_START = 1
+cdef int EV_STOP = 2
+
+
+def _i2c_decode_core(ev_t, ev_kind, ev_sda, core_state):
+    cdef int state = core_state[0]
+    cdef int shift_reg = core_state[1]
+    cdef int bit_count = core_state[2]
+    cdef double start_time = core_state[3]
+
+    cdef double [:] t_v = np.ascontiguousarray(ev_t, dtype=np.float64)
+    cdef signed char [:] ev_v = np.ascontiguousarray(ev_kind, dtype=np.int8)
+    cdef signed char [:] sda_v = np.ascontiguousarray(ev_sda, dtype=np.int8)
+
+    cdef Py_ssize_t count = t_v.shape[0]
+
+    out_kind_a = np.empty(count, dtype=np.int8)
+    out_start_a = np.empty(count, dtype=float)
+    out_end_a = np.empty(count, dtype=float)
+    out_word_a = np.empty(count, dtype=np.int32)
+    out_ack_a = np.empty(count, dtype=np.int8)
+
+    cdef signed char [:] out_kind = out_kind_a
+    cdef double [:] out_start = out_start_a
+    cdef double [:] out_end = out_end_a
+    cdef int [:] out_word = out_word_a
+    cdef signed char [:] out_ack = out_ack_a
+
+    cdef Py_ssize_t i
+    cdef Py_ssize_t rows = 0
+    cdef double t
+    cdef int ev, word, kind
+
+    for i in range(count):
+        t = t_v[i]
+        ev = ev_v[i]
+
+        if ev == EV_CLOCK:
+            if state == S_IDLE:
+                continue
+
+            # rising edge of SCL: accumulate the bit
+            if bit_count == 0:
+                start_time = t
+
+            shift_reg = (shift_reg << 1) | sda_v[i]
+            bit_count += 1
+
+            if bit_count == 9:
+                word = shift_reg >> 1
+
+                if state == S_ADDR:
+                    kind = I2C_ADDR
+                    if (word & 0xF9) == 0xF0:
+                        state = S_ADDR_10B # 10-bit addressed write
+                    else:
+                        state = S_DATA
+                elif state == S_ADDR_10B:
+                    kind = I2C_ADDR_10B
+                    state = S_DATA
+                else:
+                    kind = I2C_DATA
+
+                out_kind[rows] = kind
+                out_start[rows] = start_time
+                out_end[rows] = t
+                out_word[rows] = word
+                out_ack[rows] = shift_reg & 0x01
+                rows += 1
+
+                shift_reg = 0
+                bit_count = 0
+
+        else: # start, restart, or stop condition
+            if state == S_IDLE:
+                if ev != EV_START:
+                    continue
+                kind = I2C_START
+                state = S_ADDR
+
+            elif ev == EV_STOP:
+                kind = I2C_STOP
+                state = S_IDLE
+
+            else:
+                kind = I2C_RESTART
+                state = S_ADDR
+
+            out_kind[rows] = kind
+            out_start[rows] = t
+            out_end[rows] = t
+            out_word[rows] = 0
+            out_ack[rows] = 0
+            rows += 1
+
+            shift_reg = 0
+            bit_count = 0
+
+    core_state[:] = [state, shift_reg, bit_count, start_time]
+
+    return (out_kind_a[:rows], out_start_a[:rows], out_end_a[:rows], out_word_a[:rows], out_ack_a[:rows])
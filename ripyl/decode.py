@@ -592,77 +592,49 @@ def find_edges(samples, logic, hysteresis=0.4):
     hyst_top = span * (0.5 + hysteresis / 2.0) + logic[0]
     hyst_bot = span * (0.5 - hysteresis / 2.0) + logic[0]
 
-    
     # A sample can be in one of three zones: two logic states (1, 0) and
-    # one transition bands for the hysteresis
-    
-    ZONE_1_L1 = 1 # logic 1
-    ZONE_2_T  = 2 # transition
-    ZONE_3_L0 = 3 # logic 0
-    
-    def get_sample_zone(sample):
-        if sample > hyst_top:
-            zone = ZONE_1_L1
-        elif sample > hyst_bot:
-            zone = ZONE_2_T
-        else:
-            zone = ZONE_3_L0
-            
-        return zone
-        
-    def is_stable_zone(zone):
-        return zone == ZONE_1_L1 or zone == ZONE_3_L0
-        
-    def zone_to_logic_state(zone):
-        ls = 999
-        if zone == ZONE_1_L1: ls = 1
-        elif zone == ZONE_3_L0: ls = 0
-        
-        return ls
-    
-    
-    # states
-    ES_START = 0
-    
-    state = ES_START
-    
+    # one transition band for the hysteresis. Samples in the transition band
+    # never change the state so only the samples in the stable zones are
+    # examined. An edge is a stable sample with a different logic state than
+    # the stable sample before it.
+
+    prev_state = None # Logic state of the last stable sample
+
     for sc in samples:
         t = sc.start_time
         sample_period = sc.sample_period
-        chunk = sc.samples
+        chunk = np.asarray(sc.samples)
 
-        if state == ES_START: # set initial edge state
+        if prev_state is None: # set initial edge state
             initial_state = (t, 1 if chunk[0] > thresh else 0)
             yield initial_state
 
-        for sample in chunk:
-
-            zone = get_sample_zone(sample)
-            
-            if state == ES_START:
-                # Stay in start until we reach one of the stable states
-                if is_stable_zone(zone):
-                    state = zone
-
-            # last zone was a stable state
-            elif state == ZONE_1_L1 or state == ZONE_3_L0:
-                if is_stable_zone(zone):
-                    if zone != state:
-                        state = zone
-                        yield (t, zone_to_logic_state(zone))
-                else:
-                    prev_stable = state
-                    state = zone
-            
-            # last zone was a transitional state (in hysteresis band)
-            elif state == ZONE_2_T:
-                if is_stable_zone(zone):
-                    if zone != prev_stable: # This wasn't just noise
-                        yield (t, zone_to_logic_state(zone))
-
-                state = zone
-
-            t += sample_period
+        high = chunk > hyst_top
+        stable_ix = np.flatnonzero(high | (chunk <= hyst_bot))
+        if len(stable_ix) == 0:
+            continue
+
+        states = high[stable_ix].astype(np.int8)
+        prev_states = np.empty_like(states)
+        # The first stable sample only sets the initial state
+        prev_states[0] = states[0] if prev_state is None else prev_state
+        prev_states[1:] = states[:-1]
+        changed = states != prev_states
+        prev_state = states[-1]
+
+        edge_ix = stable_ix[changed]
+        if len(edge_ix) == 0:
+            continue
+
+        # Sample times are a running sum so that they are identical to stepping
+        # through the chunk one sample at a time
+        times = np.empty(edge_ix[-1] + 1)
+        times[0] = t
+        times[1:] = sample_period
+        np.cumsum(times, out=times)
+
+        for edge in zip(times[edge_ix].tolist(), states[changed].tolist()):
+            yield edge
 
 
 def expand_logic_levels(logic_levels, count):
@@ -24,12 +24,12 @@
 from __future__ import print_function, division
 
 import itertools
+import numpy as np
 
 from ripyl.decode import *
 import ripyl.streaming as stream
 from ripyl.util.enum import Enum
 from ripyl.util.bitops import *
-from ripyl.sigproc import remove_excess_edges
 
 class I2C(Enum):
     '''Enumeration for I2C r/w bit states'''
@@ -37,8 +37,20 @@ class I2C(Enum):
     Read = 1
 
 
+class I2CRecordKind(Enum):
+    '''Enumeration for the kind column of I2C record batches'''
+    Start = 0
+    Restart = 1
+    Stop = 2
+    Address = 3     # First (or only) address byte
+    Address10b = 4  # Second byte of a 10-bit address
+    Data = 5
+
+
 class I2CByte(stream.StreamSegment):
     '''Segment for a byte of I2C data'''
+    __slots__ = ('ack_bit',)
+
     def __init__(self, bounds, data=None, ack_bit=None):
         stream.StreamSegment.__init__(self, bounds, data)
         self.kind = 'I2C byte'
@@ -53,6 +65,8 @@ class I2CAddress(stream.StreamSegment):
     
     The byte(s) composing the address are contained as subrecords
     '''
+    __slots__ = ('r_wn',)
+
     def __init__(self, bounds, address=None, r_wn=None):
         '''
         r_wn (int)
@@ -130,6 +144,37 @@ def i2c_decode(scl, sda, logic_levels=None, stream_type=stream.StreamType.Sample
     Raises AutoLevelError when the stream_type is Samples and the logic levels cannot
       be determined automatically.
     '''
+
+    for batch in i2c_decode_batches(scl, sda, logic_levels, stream_type):
+        for r in batch:
+            yield r
+
+
+def i2c_decode_batches(scl, sda, logic_levels=None, stream_type=stream.StreamType.Samples):
+    '''Decode an I2C data stream into columnar batches
+
+    This is a generator function that can be used in a pipeline of waveform
+    processing operations. It performs the same decode as i2c_decode() but the
+    results are delivered as StreamBatch objects holding numpy arrays. Consumers
+    that only need the raw values can use the arrays directly without creating
+    any StreamRecord objects.
+
+    The parameters are the same as for i2c_decode().
+
+    Yields a series of StreamBatch objects with these columns:
+
+        * start_time  Time of the first clock of a byte or the time of a bus condition
+        * end_time    Time of the last clock of a byte or the time of a bus condition
+        * data        The byte value (0 for bus conditions)
+        * kind        An I2CRecordKind value
+        * ack_bit     The ACK bit of a byte (0 for bus conditions)
+
+      Iterating over a batch generates the same records that i2c_decode() yields. The
+      batches must be iterated in order because a 10-bit address can span two batches.
+
+    Raises AutoLevelError when the stream_type is Samples and the logic levels cannot
+      be determined automatically.
+    '''
     
     if stream_type == stream.StreamType.Samples:
         if logic_levels is None:
@@ -142,174 +187,392 @@ def i2c_decode(scl, sda, logic_levels=None, stream_type=stream.StreamType.Sample
         sda_it = find_edges(sda, logic_levels, hysteresis=hyst)
 
     else: # the streams are already lists of edges
-        scl_it = scl
-        sda_it = sda
+        scl_it = iter(scl)
+        sda_it = iter(sda)
 
+    # The first element of each edge stream is the initial state of the signal
+    try:
+        scl_init = next(scl_it)
+        sda_init = next(sda_it)
+    except StopIteration:
+        raise StreamError('Not enough edges to initialize I2C decoder')
 
-    edge_sets = {
-        'scl': scl_it,
-        'sda': sda_it
-    }
-    
-    es = MultiEdgeSequence(edge_sets, 0.0)
-    
-    S_IDLE = 0
-    S_ADDR = 1
-    S_ADDR_10B = 2
-    S_DATA = 3
+    bus_levels = [scl_init[1], sda_init[1]]
+    core_state = [_S_IDLE, 0, 0, 0.0]
+    build_records = _I2CRecordBuilder()
 
-    state = S_IDLE
-    
-    start_time = None
-    end_time = None
-    bits = []
-    prev_10b_addr = None
-    
-    while not es.at_end():
-    
-        ts, cname = es.advance_to_edge()
-        
-        if state == S_IDLE:
-            bits = []
-            if cname == 'sda' and not es.at_end('sda') \
-            and es.cur_state('sda') == 0 and es.cur_state('scl') == 1:
-                # start condition met
-                se = stream.StreamEvent(es.cur_time(), data=None, kind='I2C start')
-                yield se
-                state = S_ADDR
-                
+    for edge_t, edge_c, edge_v in _merge_edge_blocks(scl_it, sda_it):
+        ev_ix, ev_kind, ev_sda = _find_bus_events(edge_c, edge_v, bus_levels)
+        kinds, starts, ends, words, acks = _i2c_decode_core(edge_t[ev_ix], ev_kind, ev_sda, core_state)
+
+        if len(kinds) > 0:
+            yield stream.StreamBatch(starts, ends, words, kinds, build_records, ack_bit=acks)
+
+
+class _I2CRecordBuilder(object):
+    '''Convert the rows of I2C batches into StreamRecord objects
+
+    The first byte of a 10-bit address and the last 10-bit address written
+    are carried from one batch to the next so batches must be converted in order.
+    '''
+    def __init__(self):
+        self.first_addr = None
+        self.first_ack = None
+        self.prev_10b_addr = None
+
+    def _addr_7b(self, word, ack_bit, f_bound, d_bound, a_bound, a_status):
+        '''Build the record for a 7-bit address'''
+        na = I2CAddress(f_bound, word >> 1, word & 0x01)
+        na.annotate('frame', {}, stream.AnnotationFormat.Hidden)
+        na.subrecords.append(I2CByte(d_bound, word, ack_bit))
+        addr_text = '{:02X} {}'.format(word >> 1, 'r' if word & 0x01 else 'w')
+        na.subrecords[-1].annotate('addr', {'value':addr_text, '_bits':8}, stream.AnnotationFormat.Hex)
+        na.subrecords.append(stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status))
+        na.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
+
+        return na
+
+    def _addr_10b_write(self, word, ack_bit, f_bound, d_bound, a_bound, a_status):
+        '''Save the first byte of a 10-bit addressed write
+
+        The record is built when the second address byte arrives.
+        '''
+        self.first_addr = I2CByte(d_bound, word, ack_bit)
+        self.first_ack = stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status)
+
+        return None
+
+    def _addr_10b_read(self, word, ack_bit, f_bound, d_bound, a_bound, a_status):
+        '''Build the record for a 10-bit addressed read'''
+        # We will not receive the second byte of the address
+        # The 10-bit address being read should be the last one
+        # written to.
+        ub = (word >> 1) & 0x03
+        if self.prev_10b_addr is not None and ub == (self.prev_10b_addr >> 8) & 0x03:
+            addr_10b = self.prev_10b_addr
+        else: # This shouldn't happen
+            addr_10b = 0xFFF # invalid address
+
+        na = I2CAddress(f_bound, addr_10b, 1)
+        if addr_10b < 0xFFF:
+            addr_text = '{:02X} r'.format(addr_10b)
+        else: # Missing second address byte
+            addr_text = '{:1X}?? r'.format(ub)
+        na.annotate('frame', {'value':addr_text}, stream.AnnotationFormat.String)
+        na.subrecords.append(I2CByte(d_bound, word, ack_bit))
+        na.subrecords[-1].annotate('addr', {'_bits':8}, stream.AnnotationFormat.Hidden)
+        na.subrecords.append(stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status))
+        na.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
+
+        return na
+
+    # Address handlers indexed by (10-bit prefix << 1) | r_wn
+    _ADDR_HANDLERS = (_addr_7b, _addr_7b, _addr_10b_write, _addr_10b_read)
+
+    def __call__(self, batch):
+        '''Generate the StreamRecord objects for a batch
+
+        This is a generator function.
+        '''
+        for kind, start_time, end_time, word, ack_bit in zip(batch.kind.tolist(), \
+            batch.start_time.tolist(), batch.end_time.tolist(), batch.data.tolist(), \
+            batch.columns['ack_bit'].tolist()):
+
+            if kind == _I2C_START:
+                yield stream.StreamEvent(start_time, data=None, kind='I2C start')
+                continue
+
+            if kind == _I2C_STOP:
+                yield stream.StreamEvent(start_time, data=None, kind='I2C stop')
+                continue
+
+            if kind == _I2C_RESTART:
+                yield stream.StreamEvent(start_time, data=None, kind='I2C restart')
+                continue
+
+            clock_period = (end_time - start_time) / 9.0
+            f_bound = (start_time - 0.4 * clock_period, end_time + 0.4 * clock_period)
+            d_start = start_time - 0.25 * clock_period
+            d_bound = (d_start, d_start + 8.5 * clock_period)
+            a_bound = (end_time - 0.25 * clock_period, end_time + 0.25 * clock_period)
+            a_status = stream.StreamStatus.Ok if ack_bit == 0 else stream.StreamStatus.Error
+
+
+            if kind == _I2C_ADDR:
+                # The first byte of a 10-bit address is 11110XX + R/W
+                is_10b = (word & 0xF8) == 0xF0
+                handler = self._ADDR_HANDLERS[(is_10b << 1) | (word & 0x01)]
+                na = handler(self, word, ack_bit, f_bound, d_bound, a_bound, a_status)
+                if na is not None:
+                    yield na
+
+            elif kind == _I2C_ADDR_10B: # 10-bit address
+                addr = (((self.first_addr.data >> 1) & 0x03) << 8) | word
+                r_wn = self.first_addr.data & 0x01
+                na = I2CAddress((self.first_addr.start_time - 0.4*clock_period, f_bound[1]), addr, r_wn)
+                addr_text = '{:02X} {}'.format(addr, 'r' if r_wn else 'w')
+                na.annotate('frame', {'value':addr_text}, stream.AnnotationFormat.String)
+                na.subrecords.append(self.first_addr)
+                na.subrecords[-1].annotate('addr', {'_bits':8}, stream.AnnotationFormat.Hidden)
+                na.subrecords.append(self.first_ack)
+                na.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
+
+                na.subrecords.append(I2CByte(d_bound, word, ack_bit))
+                na.subrecords[-1].annotate('addr', {'_bits':8}, stream.AnnotationFormat.Hidden)
+                na.subrecords.append(stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status))
+                na.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
+
+                self.prev_10b_addr = addr
+                yield na
+
+            else: # _I2C_DATA
+                nb = I2CByte(f_bound, word, ack_bit)
+                nb.annotate('frame', {}, stream.AnnotationFormat.Hidden)
+                nb.subrecords.append(stream.StreamSegment(d_bound, word, kind='data'))
+                nb.subrecords[-1].annotate('data', {'_bits':8})
+                nb.subrecords.append(stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status))
+                nb.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
+
+                yield nb
+
+
+# Decoder states for _i2c_decode_core()
+_S_IDLE = 0
+_S_ADDR = 1
+_S_ADDR_10B = 2
+_S_DATA = 3
+
+# Row kinds produced by _i2c_decode_core()
+_I2C_START = I2CRecordKind.Start
+_I2C_RESTART = I2CRecordKind.Restart
+_I2C_STOP = I2CRecordKind.Stop
+_I2C_ADDR = I2CRecordKind.Address
+_I2C_ADDR_10B = I2CRecordKind.Address10b
+_I2C_DATA = I2CRecordKind.Data
+
+# Events produced by _find_bus_events()
+_EV_CLOCK = 0   # Rising edge of SCL
+_EV_START = 1   # SDA falls while SCL is high
+_EV_STOP = 2    # SDA rises while SCL is high
+
+# Transitions for start and stop events indexed by (state << 2) | event.
+# Each entry is (next state, row kind) or None when the event is ignored.
+_COND_ACTIONS = [None] * 16
+for _s in (_S_IDLE, _S_ADDR, _S_ADDR_10B, _S_DATA):
+    if _s == _S_IDLE:
+        _COND_ACTIONS[(_s << 2) | _EV_START] = (_S_ADDR, _I2C_START)
+    else:
+        _COND_ACTIONS[(_s << 2) | _EV_START] = (_S_ADDR, _I2C_RESTART)
+        _COND_ACTIONS[(_s << 2) | _EV_STOP] = (_S_IDLE, _I2C_STOP)
+del _s
+
+# Transitions on completion of a byte indexed by state: (row kind, next state).
+# A 10-bit address prefix moves from _S_ADDR to _S_ADDR_10B instead.
+_BYTE_ACTIONS = [None, (_I2C_ADDR, _S_DATA), (_I2C_ADDR_10B, _S_DATA), (_I2C_DATA, _S_DATA)]
+
+
+def _merge_edge_blocks(scl_it, sda_it, block_size=10000):
+    '''Merge the SCL and SDA edge streams into time ordered blocks
+
+    This is a generator function. Edges are pulled from each stream block_size at a
+    time and only those earlier than the last edge read from every unfinished stream are
+    released so that the merged output stays in chronological order.
+
+    scl_it (iterator of (float, int))
+        SCL edge stream with its initial state already consumed
+
+    sda_it (iterator of (float, int))
+        SDA edge stream with its initial state already consumed
+
+    block_size (int)
+        The number of edges to read from each stream per block
+
+    Yields a series of 3-tuples of numpy arrays (time, channel, level) where channel
+      is 0 for SCL and 1 for SDA. Simultaneous edges are ordered with SCL first.
+    '''
+    edge_its = (scl_it, sda_it)
+    pending = [np.empty((0, 2)), np.empty((0, 2))]
+    ended = [False, False]
+
+    while True:
+        for c, it in enumerate(edge_its):
+            if not ended[c]:
+                new_edges = list(itertools.islice(it, block_size))
+                if len(new_edges) < block_size:
+                    ended[c] = True
+                if len(new_edges) > 0:
+                    pending[c] = np.concatenate((pending[c], np.array(new_edges, dtype=float)))
+
+        if all(ended):
+            horizon = float('inf')
         else:
-            # check for stop and restart
-            if cname == 'sda' and not es.at_end('sda'):
-                if es.cur_state('sda') == 1 and es.cur_state('scl') == 1:
-                    # stop condition met
-                    se = stream.StreamEvent(es.cur_time(), data=None, kind='I2C stop')
-                    yield se
-                    state = S_IDLE
-                    continue
-                    
-                if es.cur_state('sda') == 0 and es.cur_state('scl') == 1:
-                    # restart condition met
-                    se = stream.StreamEvent(es.cur_time(), data=None, kind='I2C restart')
-                    yield se
-                    bits = []
-                    state = S_ADDR
-                    continue
-
-            if cname == 'scl' and not es.at_end('scl') and es.cur_state('scl') == 1:
-                # rising edge of SCL
-                
-                # accumulate the bit
-                if len(bits) == 0:
-                    start_time = es.cur_time()
-    
-                bits.append(es.cur_state('sda'))
-                end_time = es.cur_time()
-                
-                if len(bits) == 9:
-                    word = join_bits(bits[0:8])
-                    ack_bit = bits[8]
-
-                    clock_period = (end_time - start_time) / 9.0
-                    f_bound = (start_time - 0.4 * clock_period, end_time + 0.4 * clock_period)
-                    d_start = start_time - 0.25 * clock_period
-                    d_bound = (d_start, d_start + 8.5 * clock_period)
-                    a_bound = (end_time - 0.25 * clock_period, end_time + 0.25 * clock_period)
-                    a_status = stream.StreamStatus.Ok if ack_bit == 0 else stream.StreamStatus.Error
-
-
-                    if state == S_ADDR:
-                        addr = word >> 1
-                        r_wn = word & 0x01
-                        if addr > 0x77: # first 2 bits of 10-bit address
-                            if r_wn: # 10-bit addressed read
-                                # We will not receive the second byte of the address
-                                # The 10-bit address being read should be the last one
-                                # written to.
-                                if prev_10b_addr is not None:
-                                    addr_10b = prev_10b_addr
-                                    
-                                    # Check that the upper bits match
-                                    ub = addr & 0x03
-                                    prev_ub = (prev_10b_addr >> 8) & 0x03
-                                    if ub != prev_ub: # This shouldn't happen
-                                        addr_10b = 0xFFF # invalid address
-                                    
-                                else: # This shouldn't happen
-                                    addr_10b = 0xFFF # invalid address
-                                
-                                na = I2CAddress(f_bound, addr_10b, r_wn)
-                                if addr_10b < 0xFFF:
-                                    addr_text = '{:02X} {}'.format(addr_10b, 'r' if word & 0x01 else 'w')
-                                else: # Missing second address byte
-                                    addr_text = '{:1X}?? {}'.format(addr & 0x03, 'r' if word & 0x01 else 'w')
-                                na.annotate('frame', {'value':addr_text}, stream.AnnotationFormat.String)
-                                na.subrecords.append(I2CByte(d_bound, word, ack_bit))
-                                na.subrecords[-1].annotate('addr', {'_bits':8}, stream.AnnotationFormat.Hidden)
-                                na.subrecords.append(stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status))
-                                na.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
-
-                                yield na
-                                bits = []
-                                
-                                state = S_DATA
-                            
-                            else: # 10-bit addressed write: first byte
-                                first_addr = I2CByte(d_bound, word, ack_bit)
-                                first_ack = stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status)
-                                bits = []
-                                state = S_ADDR_10B
-                            
-                        else: # 7-bit address
-                            r_wn = word & 0x01
-                            na = I2CAddress(f_bound, addr, r_wn)
-                            na.annotate('frame', {}, stream.AnnotationFormat.Hidden)
-                            na.subrecords.append(I2CByte(d_bound, word, ack_bit))
-                            addr_text = '{:02X} {}'.format(word >> 1, 'r' if word & 0x01 else 'w')
-                            na.subrecords[-1].annotate('addr', {'value':addr_text, '_bits':8}, stream.AnnotationFormat.Hex)
-                            na.subrecords.append(stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status))
-                            na.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
-
-                            yield na
-                            bits = []
-
-                            state = S_DATA
-
-                    elif state == S_ADDR_10B: # 10-bit address
-                        addr = (((first_addr.data >> 1) & 0x03) << 8) | word
-                        r_wn = first_addr.data & 0x01
-                        na = I2CAddress((first_addr.start_time - 0.4*clock_period, f_bound[1]), addr, r_wn)
-                        addr_10b = (((first_addr.data*256)>> 1) + word) & 0x3FF
-                        addr_text = '{:02X} {}'.format(addr_10b, 'r' if first_addr.data & 0x01 else 'w')
-                        na.annotate('frame', {'value':addr_text}, stream.AnnotationFormat.String)
-                        na.subrecords.append(first_addr)
-                        na.subrecords[-1].annotate('addr', {'_bits':8}, stream.AnnotationFormat.Hidden)
-                        na.subrecords.append(first_ack)
-                        na.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
-
-                        na.subrecords.append(I2CByte(d_bound, word, ack_bit))
-                        na.subrecords[-1].annotate('addr', {'_bits':8}, stream.AnnotationFormat.Hidden)
-                        na.subrecords.append(stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status))
-                        na.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
-
-                        
-                        prev_10b_addr = addr_10b
-                        yield na
-                        bits = []
-
-                        state = S_DATA
-                                    
-
-                    else: # S_DATA
-                        nb = I2CByte(f_bound, word, ack_bit)
-                        nb.annotate('frame', {}, stream.AnnotationFormat.Hidden)
-                        nb.subrecords.append(stream.StreamSegment(d_bound, word, kind='data'))
-                        nb.subrecords[-1].annotate('data', {'_bits':8})
-                        nb.subrecords.append(stream.StreamSegment(a_bound, ack_bit, kind='ack', status=a_status))
-                        nb.subrecords[-1].annotate('ack', {'_bits':1}, stream.AnnotationFormat.Hidden)
-
-                        yield nb
-                        bits = []
+            horizon = min(pending[c][-1, 0] for c in (0, 1) if not ended[c])
+
+        parts = []
+        for c in (0, 1):
+            split = np.searchsorted(pending[c][:, 0], horizon, side='left')
+            parts.append(pending[c][:split])
+            pending[c] = pending[c][split:]
+
+        edge_t = np.concatenate((parts[0][:, 0], parts[1][:, 0]))
+        if len(edge_t) > 0:
+            edge_c = np.concatenate((np.zeros(len(parts[0]), dtype=np.int8), np.ones(len(parts[1]), dtype=np.int8)))
+            edge_v = np.concatenate((parts[0][:, 1], parts[1][:, 1])).astype(np.int8)
+
+            # Both channels are already in time order. A stable sort of the
+            # concatenated runs keeps SCL ahead of SDA for simultaneous edges.
+            order = np.argsort(edge_t, kind='mergesort')
+            yield (edge_t[order], edge_c[order], edge_v[order])
+
+        if all(ended):
+            break
+
+
+def _find_bus_events(edge_c, edge_v, levels):
+    '''Classify a block of merged edges into the events the I2C state machine acts on
+
+    Edges that don't change a signal's level are dropped and the level of SCL at
+    every SDA edge is found with vectorized operations. Falling SCL edges and SDA
+    changes while SCL is low are not needed by the decoder and are discarded.
+
+    edge_c (numpy array of int)
+        Channel of each edge: 0 for SCL, 1 for SDA
+
+    edge_v (numpy array of int)
+        Logic level of each edge
+
+    levels (list of int)
+        The [SCL, SDA] levels before the block. Updated in place with the levels
+        after the block.
+
+    Returns a tuple (index, event, sda level) of numpy arrays. The index array selects
+      the edges in the block that produced an event.
+    '''
+    count = len(edge_c)
+    ix = np.arange(count)
+    changed = np.zeros(count, dtype=bool)
+    cur_levels = []
+
+    for c in (0, 1):
+        c_mask = edge_c == c
+        c_ix = ix[c_mask]
+        c_v = edge_v[c_mask]
+
+        # Keep only the edges that change this channel's level
+        prev_v = np.empty_like(c_v)
+        prev_v[:1] = levels[c]
+        prev_v[1:] = c_v[:-1]
+        c_changed = c_v != prev_v
+        changed[c_ix[c_changed]] = True
+
+        # Level of this channel after each edge in the block
+        last_ix = np.maximum.accumulate(np.where(c_mask, ix, -1))
+        c_level = np.where(last_ix >= 0, edge_v[last_ix], levels[c])
+        cur_levels.append(c_level)
+
+        if len(c_v) > 0:
+            levels[c] = int(c_v[-1])
+
+    scl_level, sda_level = cur_levels
+    is_scl = edge_c == 0
+
+    clock = changed & is_scl & (edge_v == 1)
+    start = changed & ~is_scl & (edge_v == 0) & (scl_level == 1)
+    stop = changed & ~is_scl & (edge_v == 1) & (scl_level == 1)
+
+    events = np.empty(count, dtype=np.int8)
+    events.fill(-1)
+    events[clock] = _EV_CLOCK
+    events[start] = _EV_START
+    events[stop] = _EV_STOP
+
+    ev_ix = np.flatnonzero(events >= 0)
+
+    return (ev_ix, events[ev_ix], sda_level[ev_ix])
+
+
+def _i2c_decode_core(ev_t, ev_kind, ev_sda, core_state):
+    '''Run the I2C bus state machine over a block of bus events
+
+    This is the inner loop of i2c_decode(). It only works with plain numbers so that
+    it can be replaced by a compiled implementation.
+
+    ev_t (numpy array of float)
+        Time of each event
+
+    ev_kind (numpy array of int)
+        Event produced by _find_bus_events(): a rising SCL edge, or an SDA edge
+        in the start or stop direction while SCL is high
+
+    ev_sda (numpy array of int)
+        Level of SDA at each event
+
+    core_state (list)
+        Decoder state carried between blocks:
+        [state, shift register, bit count, first bit time].
+        It is updated in place.
+
+    Returns a tuple of numpy arrays (kind, start time, end time, word, ack bit) with
+      one row per bus condition or byte found in the block. The start and end times
+      of a bus condition are equal.
+    '''
+    state, shift_reg, bit_count, start_time = core_state
+
+    count = len(ev_t)
+    out_kind = np.empty(count, dtype=np.int8)
+    out_start = np.empty(count, dtype=float)
+    out_end = np.empty(count, dtype=float)
+    out_word = np.empty(count, dtype=np.int32)
+    out_ack = np.empty(count, dtype=np.int8)
+    rows = 0
+
+    for t, ev, sda in zip(ev_t.tolist(), ev_kind.tolist(), ev_sda.tolist()):
+        if ev == _EV_CLOCK:
+            if state == _S_IDLE:
+                continue
+
+            # rising edge of SCL: accumulate the bit
+            if bit_count == 0:
+                start_time = t
+
+            shift_reg = (shift_reg << 1) | sda
+            bit_count += 1
+
+            if bit_count == 9:
+                word = shift_reg >> 1
+
+                kind, state = _BYTE_ACTIONS[state]
+                if kind == _I2C_ADDR and (word & 0xF9) == 0xF0:
+                    state = _S_ADDR_10B # 10-bit addressed write
+
+                out_kind[rows] = kind
+                out_start[rows] = start_time
+                out_end[rows] = t
+                out_word[rows] = word
+                out_ack[rows] = shift_reg & 0x01
+                rows += 1
+
+                shift_reg = 0
+                bit_count = 0
+
+        else: # start, restart, or stop condition
+            action = _COND_ACTIONS[(state << 2) | ev]
+            if action is None:
+                continue
+            state, out_kind[rows] = action
+
+            out_start[rows] = t
+            out_end[rows] = t
+            out_word[rows] = 0
+            out_ack[rows] = 0
+            rows += 1
+
+            shift_reg = 0
+            bit_count = 0
+
+    core_state[:] = [state, shift_reg, bit_count, start_time]
+
+    return (out_kind[:rows], out_start[:rows], out_end[:rows], out_word[:rows], out_ack[:rows])
 
 
 class I2CTransfer(stream.StreamRecord):
@@ -383,18 +646,11 @@ class I2CTransfer(stream.StreamRecord):
         return 'I2CTransfer({}, {}, {})'.format(self.r_wn, hex(self.address), self.data)
         
     def __eq__(self, other):
-        match = True
-        
-        if self.r_wn != other.r_wn:
-            match = False
-            
-        if self.address != other.address:
-            match = False
-        
-        if bytearray(self.data) != bytearray(other.data):
-            match = False
-            
-        return match
+        if self.r_wn != other.r_wn or self.address != other.address:
+            return False
+
+        # Data may be any sequence of ints so normalize before comparing
+        return bytearray(self.data) == bytearray(other.data)
         
     def __ne__(self, other):
         return not self == other
@@ -431,12 +687,12 @@ def reconstruct_i2c_transfers(records):
                
         elif state == S_DATA:
             if r.kind == 'I2C byte':
-                cur_data.append(r)
+                cur_data.append(r.data)
                 subrecords.append(r)
             
             if r.kind == 'I2C address':
                 # reconstruct previous transfer
-                tfer = I2CTransfer(cur_addr.r_wn, cur_addr.address, [b.data for b in cur_data])
+                tfer = I2CTransfer(cur_addr.r_wn, cur_addr.address, cur_data)
                 tfer.annotate('frame', {}, stream.AnnotationFormat.Hidden)
                 for sr in subrecords: # Strip the enclosing frame from the bytes
                     tfer.subrecords.extend(sr.subrecords)
@@ -449,7 +705,7 @@ def reconstruct_i2c_transfers(records):
             
     if cur_addr is not None:
         # reconstruct last transfer
-        tfer = I2CTransfer(cur_addr.r_wn, cur_addr.address, [b.data for b in cur_data])
+        tfer = I2CTransfer(cur_addr.r_wn, cur_addr.address, cur_data)
         tfer.annotate('frame', {}, stream.AnnotationFormat.Hidden)
         for sr in subrecords: # Strip the enclosing frame from the bytes
             tfer.subrecords.extend(sr.subrecords)
@@ -462,7 +718,7 @@ def i2c_synth(transfers, clock_freq, idle_start=0.0, transfer_interval=0.0, idle
     
     This function simulates I2C transfers on the SCL and SDA signals.
 
-    transfers (sequence of I2CTransfer objects)
+    transfers (iterable of I2CTransfer objects)
         Data to be synthesized.
     
     clock_freq (float)
@@ -484,83 +740,96 @@ def i2c_synth(transfers, clock_freq, idle_start=0.0, transfer_interval=0.0, idle
       iterators are the initial state of the waveforms.
     '''
     # This is a wrapper around the actual synthesis code in _i2c_synth()
-    # It unzips the yielded tuple and removes unwanted artifact edges
-    scl, sda = itertools.izip(*_i2c_synth(transfers, clock_freq, idle_start, transfer_interval, idle_end))
-    scl = remove_excess_edges(scl)
-    sda = remove_excess_edges(sda)
-    return scl, sda
+    # It splits the waveform into separate edge streams holding only real transitions
+    edge_t, scl_v, sda_v = _i2c_synth(transfers, clock_freq, idle_start, transfer_interval, idle_end)
+    return _edge_transitions(edge_t, scl_v), _edge_transitions(edge_t, sda_v)
+
+
+def _edge_transitions(edge_t, levels):
+    '''Reduce a synthesized signal to an edge stream
+
+    edge_t (numpy array of float)
+        Time of each row of the waveform
+
+    levels (numpy array of int)
+        Logic level of the signal at each row
+
+    Returns an iterator of (time, value) pairs for the initial state, each change
+      of level, and the final state of the signal.
+    '''
+    keep = np.empty(len(levels), dtype=bool)
+    keep[0] = True
+    keep[1:] = levels[1:] != levels[:-1]
+    keep[-1] = True
+
+    return iter(zip(edge_t[keep].tolist(), levels[keep].tolist()))
+
+
+# Bits of every byte value, MSB first
+_SPLIT8 = (np.arange(256)[:, np.newaxis] >> np.arange(7, -1, -1)) & 0x01
 
 
 def _i2c_synth(transfers, clock_freq, idle_start=0.0, transfer_interval=0.0, idle_end=0.0):
     '''Core I2C synthesizer
     
-    This is a generator function.
+    Returns a tuple of numpy arrays (time, scl, sda) with the state of both
+      signals at each point where either of them may change.
     '''
 
-    t = 0.0
-    sda = 1
-    scl = 1
-    
     half_bit_period = 1.0 / (2.0 * clock_freq)
-    
-    yield ((t, scl), (t, sda)) # initial conditions
-    t += idle_start
-    
+    quarter_bit_period = half_bit_period / 2.0
+
+    # The waveform is assembled from parts. Each row of a part is an SCL state,
+    # an SDA state, and the time step to the next row.
+    scl_parts = [np.array([1])] # initial conditions
+    sda_parts = [np.array([1])]
+    step_parts = [np.array([idle_start])]
+
+    # Each bit is set on SDA then clocked by a pulse on SCL
+    bit_scl = np.array([0, 1, 0])
+    bit_steps = np.array([quarter_bit_period, half_bit_period, quarter_bit_period])
+
+    transfers = list(transfers)
+    n_tfer = len(transfers)
+
+    scl = 1
     for i, tfer in enumerate(transfers):
         # generate start
-        sda = 0
-        yield ((t, scl), (t, sda))
-        
-        t += half_bit_period / 2.0
+        scl_parts.append(np.array([1, 0]))
+        sda_parts.append(np.array([0, 0]))
+        step_parts.append(np.array([quarter_bit_period, quarter_bit_period]))
+
+        tfer_bytes = np.array(tfer.bytes())
+        bits = np.empty((len(tfer_bytes), 9), dtype=int)
+        bits[:, :8] = _SPLIT8[tfer_bytes & 0xFF]
+        bits[:, 8] = tfer.ack_bits()[:len(tfer_bytes)]
+        bits = bits.ravel()
+
+        scl_parts.append(np.tile(bit_scl, len(bits)))
+        sda_parts.append(np.repeat(bits, 3))
+        step_parts.append(np.tile(bit_steps, len(bits)))
         scl = 0
-        yield ((t, scl), (t, sda))
-        
-        t += half_bit_period / 2.0
-    
-        ack_bits = tfer.ack_bits()
-        for j, byte in enumerate(tfer.bytes()):
-            bits = split_bits(byte, 8)
-            bits.append(ack_bits[j])
-            
-            for b in bits:
-                sda = b
-                yield ((t, scl), (t, sda))
-                t += half_bit_period / 2.0
-                
-                scl = 1
-                yield ((t, scl), (t, sda))
-                t += half_bit_period
-                
-                scl = 0
-                yield ((t, scl), (t, sda))
-                t += half_bit_period / 2.0
-                
+
         # Prep for repeated start unless last transfer
-        if i < len(transfers)-1:
-            sda = 1
-            yield ((t, scl), (t, sda))
-            t += half_bit_period / 2.0
-            
-            scl = 1
-            yield ((t, scl), (t, sda))
-            t += half_bit_period / 2.0
+        if i < n_tfer - 1:
+            scl_parts.append(np.array([0, 1]))
+            sda_parts.append(np.array([1, 1]))
+            step_parts.append(np.array([quarter_bit_period, quarter_bit_period]))
+
+        step_parts[-1][-1] += transfer_interval
 
-        t += transfer_interval
-            
     # generate stop after last transfer
-    sda = 0
-    yield ((t, scl), (t, sda))
-    t += half_bit_period / 2.0
-    
-    scl = 1
-    yield ((t, scl), (t, sda))
-    t += half_bit_period / 2.0
-    
-    sda = 1
-    yield ((t, scl), (t, sda))
-    t += half_bit_period / 2.0 + idle_end
-    
-    yield ((t, scl), (t, sda)) # final state
-            
-            
-                
+    scl_parts.append(np.array([scl, 1, 1, 1]))
+    sda_parts.append(np.array([0, 0, 1, 1]))
+    step_parts.append(np.array([quarter_bit_period, quarter_bit_period, \
+        quarter_bit_period + idle_end, 0.0]))
+
+    scl_v = np.concatenate(scl_parts)
+    sda_v = np.concatenate(sda_parts)
+    steps = np.concatenate(step_parts)
+
+    edge_t = np.empty(len(steps))
+    edge_t[0] = 0.0
+    np.cumsum(steps[:-1], out=edge_t[1:])
+
+    return (edge_t, scl_v, sda_v)
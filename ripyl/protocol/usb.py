@@ -167,17 +167,15 @@ class USBStreamPacket(stream.StreamSegment):
             self.subrecords[-1].annotate('check', {'_bits':16}, stream.AnnotationFormat.Hex)
             used_fields.append('CRC16')
 
-        # Add the remaining fields
-        unused_fields = [k for k in offsets.keys() if k not in used_fields]
-        # Sort them in time order
-        unused_fields = sorted(unused_fields, key=lambda f: offsets[f][0])
+        # Add the remaining fields in time order
+        unused_fields = sorted((f for f in offsets.items() if f[0] not in used_fields), key=lambda f: f[1][0])
 
-        for field in unused_fields:
+        for field, bounds in unused_fields:
             if field == 'Data':
                 data = self.packet.data
             else:
                 data = None
-            self.subrecords.append(stream.StreamSegment(offsets[field], data, kind=field))
+            self.subrecords.append(stream.StreamSegment(bounds, data, kind=field))
             self.subrecords[-1].annotate('data', {}, stream.AnnotationFormat.General)
             
             
@@ -27,6 +27,7 @@ from ripyl.util.enum import Enum
 from ripyl.util.eng import eng_si
 import string
 import math
+import pickle
 
 
 class StreamType(Enum):
@@ -78,6 +79,10 @@ class AnnotationFormat(Enum):
     Small = 9       # Small plain text
 
 
+# AnnotationFormat.Text representation of each byte value. Printable characters
+# appear as themselves and all others as a based hex literal.
+_text_chars = [chr(i) if chr(i) in string.printable else '16#{:02X}#'.format(i) for i in xrange(256)]
+
     
 class StreamRecord(object):
     '''Base class for protocol decoder output stream objects
@@ -91,6 +96,8 @@ class StreamRecord(object):
     :ivar subrecords: A list of child StreamRecord objects
 
 	'''
+    __slots__ = ('kind', 'status', 'stream_id', 'subrecords', 'data_format', 'style', 'fields', '__weakref__')
+
     def __init__(self, kind='unknown', status=StreamStatus.Ok):
         self.kind = kind
         self.status = status
@@ -100,12 +107,29 @@ class StreamRecord(object):
         self.style = None
         self.fields = {}
 
+    def __getstate__(self):
+        # Slotted records have no __dict__ so the state is gathered explicitly.
+        # This keeps all pickle protocols working.
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name != '__weakref__' and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.iteritems():
+            setattr(self, k, v)
+
     def nested_status(self):
         '''Returns the highest status value from this record and its subrecords'''
         cur_status = self.status
-        for srec in self.subrecords:
-            nstat = srec.nested_status()
-            cur_status = nstat if nstat > cur_status else cur_status
+        pending = list(self.subrecords)
+        while pending:
+            srec = pending.pop()
+            if srec.status > cur_status:
+                cur_status = srec.status
+            pending.extend(srec.subrecords)
             
         return cur_status
 
@@ -163,34 +187,24 @@ class StreamRecord(object):
         else:
             data = (self.data,)
 
-        words = []
-        for d in data:
-            if data_format == AnnotationFormat.Int:
-                words.append(str(d))
-            elif data_format == AnnotationFormat.Hex:
-                # If the '_bits' field is present we will compute the number of nibbles needed
-                # to display in hex
-                if '_bits' in self.fields:
-                    nibbles = int(math.ceil(self.fields['_bits'] / 4.0))
-                else: # Default to 2 nibbles (may leave an extraneous leading 0)
-                    nibbles = 2
-                words.append('16#{:0{}X}#'.format(d, nibbles))
-            elif data_format == AnnotationFormat.Text:
-                try:
-                    char = chr(d)
-                except ValueError:
-                    char = chr(0)
-
-                if char not in string.printable:
-                    char = '16#{:02X}#'.format(d)
-                words.append(char)
-            else:
-                words.append('?')
-
         if data_format == AnnotationFormat.Text:
-            return ''.join(words)
+            return ''.join([_text_chars[d] if 0 <= d < 256 else '16#{:02X}#'.format(d) for d in data])
+
+        if data_format == AnnotationFormat.Int:
+            words = [str(d) for d in data]
+        elif data_format == AnnotationFormat.Hex:
+            # If the '_bits' field is present we will compute the number of nibbles needed
+            # to display in hex
+            if '_bits' in self.fields:
+                nibbles = int(math.ceil(self.fields['_bits'] / 4.0))
+            else: # Default to 2 nibbles (may leave an extraneous leading 0)
+                nibbles = 2
+            hex_word = '16#{{:0{}X}}#'.format(nibbles)
+            words = [hex_word.format(d) for d in data]
         else:
-            return ' '.join(words)
+            words = ['?' for d in data]
+
+        return ' '.join(words)
 
         
     @classmethod
@@ -229,6 +243,8 @@ class StreamRecord(object):
     
 class StreamSegment(StreamRecord):
     '''A stream element that spans two points in time'''
+    __slots__ = ('_start_time', '_end_time', 'data')
+
     def __init__(self, time_bounds, data=None, kind='unknown segment', status=StreamStatus.Ok):
         StreamRecord.__init__(self, kind, status)
         self._start_time = time_bounds[0] # (start time, end time)
@@ -297,6 +313,8 @@ class StreamSegment(StreamRecord):
 
 class StreamEvent(StreamRecord):
     '''A stream element that occurs at a specific point in time'''
+    __slots__ = ('time', 'data')
+
     def __init__(self, time, data=None, kind='unknown event', status=StreamStatus.Ok):
         StreamRecord.__init__(self, kind, status)
         self.time = time
@@ -339,6 +357,55 @@ class StreamEvent(StreamRecord):
 
 
 
+class StreamBatch(object):
+    '''A block of decoded stream elements stored in columns
+
+    Protocol decoders can deliver their output as batches of numpy arrays with one
+    entry per stream element instead of as individual StreamRecord objects. Consumers
+    that only need raw values can read the arrays directly. Iterating over a batch
+    creates the equivalent StreamRecord objects on demand.
+
+    :ivar start_time: Array of element start times
+
+    :ivar end_time: Array of element end times
+
+    :ivar data: Array of element data values
+
+    :ivar kind: Array of protocol specific codes identifying the kind of each element
+
+    :ivar columns: A dict of additional protocol specific arrays keyed by name
+    '''
+    def __init__(self, start_time, end_time, data, kind, record_factory=None, **columns):
+        '''
+        start_time, end_time, data, kind (numpy arrays)
+            Columns for the elements in the batch. All must have the same length.
+
+        record_factory (callable or None)
+            Called with this batch to produce an iterable of StreamRecord objects
+
+        columns (numpy arrays)
+            Additional columns stored in the columns attribute
+        '''
+        self.start_time = start_time
+        self.end_time = end_time
+        self.data = data
+        self.kind = kind
+        self.columns = columns
+        self.record_factory = record_factory
+
+    def __len__(self):
+        return len(self.kind)
+
+    def __iter__(self):
+        if self.record_factory is None:
+            raise StreamError('StreamBatch has no record factory')
+
+        return iter(self.record_factory(self))
+
+    def __repr__(self):
+        return 'StreamBatch({0} elements)'.format(len(self))
+
+
 def save_stream(records, fh):
     '''Save a stream of StreamRecord objects to a file
     
@@ -351,24 +418,19 @@ def save_stream(records, fh):
 
     Raises TypeError when records parameter is not a sequence.
     '''
-    import pickle
-    
     # Make sure the stream is not an iterator
     if hasattr(records, '__iter__') and not hasattr(records, '__len__'):
         raise TypeError('records parameter must be a sequence, not an iterator')
     
     
+    # Anything other than a file name is assumed to be an already open handle
     opened_file = False
-    try:
-        if len(fh) > 0:
-            fh = open(fh, 'wb')
-            opened_file = True
-    except TypeError:
-        # fh isn't a string. Assume to be an already open handle
-        pass
+    if isinstance(fh, basestring):
+        fh = open(fh, 'wb')
+        opened_file = True
 
     try:
-        pickle.dump(records, fh, -1)
+        pickle.dump(records, fh, pickle.HIGHEST_PROTOCOL)
     finally:
         if opened_file:
             fh.close()
@@ -383,15 +445,11 @@ def load_stream(fh):
         
     Returns a list of StreamRecord objects
     '''
-    import pickle
+    # Anything other than a file name is assumed to be an already open handle
     opened_file = False
-    try:
-        if len(fh) > 0:
-            fh = open(fh, 'rb')
-            opened_file = True
-    except TypeError:
-        # fh isn't a string assume to be an already open handle
-        pass
+    if isinstance(fh, basestring):
+        fh = open(fh, 'rb')
+        opened_file = True
 
     try:
         records = pickle.load(fh)
@@ -25,8 +25,9 @@ from __future__ import print_function, division
 
 import numpy as np
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+import matplotlib
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import colorConverter
 import string
 import re
 
@@ -72,21 +73,215 @@ label_styles = {
     'nonprinting': LabelStyle('red', 45.0)
 }
 
+def _label_text_props():
+    '''Get the matplotlib text properties for each label style
+
+    Returns a dict of property dicts keyed by label style name. The None key
+      holds the properties for field name labels.
+    '''
+    props = {None: {'size': 'small', 'ha': 'center', 'color': '0.4'}}
+    for name, ls in label_styles.items():
+        props[name] = {'size': ls.size, 'ha': 'center', 'color': ls.color, 'rotation': ls.angle, \
+            'weight': 'bold' if ls.bold else 'normal', 'style': 'italic' if ls.italic else 'normal'}
+
+    return props
+
+
+# Fill color for annotation rectangles without a known style
+_default_fill_color = colorConverter.to_rgba('red', 0.2)
+
+# Record styles that are drawn with one of two annotation styles. 'data' alternates
+# between its variants; the others select the first variant when the record status is Ok.
+_variant_styles = {
+    'data': ('data0', 'data1'),
+    'check': ('check_good', 'check_bad'),
+    'ack': ('ack_good', 'ack_bad')
+}
+
+def _style_fill_colors():
+    '''Get the RGBA fill color of each annotation style
+
+    Returns a dict of RGBA tuples keyed by annotation style name. The
+    styles in _variant_styles map to a pair of RGBA tuples.
+    '''
+    colors = dict((name, colorConverter.to_rgba(s.color, s.alpha)) for name, s in annotation_styles.items())
+    for name, variants in _variant_styles.items():
+        colors[name] = tuple(colors.get(v, _default_fill_color) for v in variants)
+
+    return colors
+
+
 # Color sequence for waveform traces (bottom to top)
 plot_colors = ('blue', 'red', 'green')
 
+
+def _sample_vectors(s_stream, time_cache=None):
+    '''Get the samples of a stream and their time vector
+
+    s_stream (iterable of SampleChunk objects)
+        The sample stream to extract samples from.
+
+    time_cache (dict or None)
+        Time vectors keyed by (start time, sample period, count). Channels
+        sampled on the same time base share one time vector from this dict.
+
+    Returns a tuple of numpy arrays (samples, time).
+    '''
+    wf, start_time, sample_period = stream.extract_all_samples(s_stream)
+    count = len(wf)
+
+    key = (start_time, sample_period, count)
+    if time_cache is not None and key in time_cache:
+        return (wf, time_cache[key])
+
+    t = np.linspace(start_time, start_time + (count - 1) * sample_period, count)
+    if time_cache is not None:
+        time_cache[key] = t
+
+    return (wf, t)
+
+
+def _decimate(t, wf, target=4000):
+    '''Reduce a waveform to the minimum and maximum sample of evenly sized bins
+
+    The samples are split into about target bins. Each bin keeps its minimum
+    and maximum samples in their original order so that the plotted envelope
+    of the waveform is unchanged.
+
+    t (numpy array of float)
+        Time of each sample
+
+    wf (numpy array of float)
+        Samples of the waveform
+
+    target (int)
+        The number of bins to reduce the waveform to
+
+    Returns a tuple of numpy arrays (time, samples). The original arrays are
+      returned if there are fewer than two samples per bin.
+    '''
+    stride = len(wf) // target
+    if stride < 2:
+        return (t, wf)
+
+    bins = len(wf) // stride
+    binned = wf[:bins * stride].reshape(bins, stride)
+    ix_min = binned.argmin(axis=1)
+    ix_max = binned.argmax(axis=1)
+
+    base = np.arange(bins) * stride
+    keep = np.empty(2 * bins + len(wf) - bins * stride, dtype=int)
+    keep[0:2 * bins:2] = base + np.minimum(ix_min, ix_max)
+    keep[1:2 * bins:2] = base + np.maximum(ix_min, ix_max)
+    keep[2 * bins:] = np.arange(bins * stride, len(wf)) # Leftover samples
+
+    return (t[keep], wf[keep])
+
+
+def _decimate_view(t, wf, target=4000, xlim=None):
+    '''Decimate a waveform with bins sized to a visible time range
+
+    The samples within xlim are decimated into about target bins. The samples
+    before and after it are decimated separately so they remain available when
+    the view is panned or zoomed out.
+
+    t (numpy array of float)
+        Time of each sample
+
+    wf (numpy array of float)
+        Samples of the waveform
+
+    target (int)
+        The number of bins to reduce the visible part of the waveform to
+
+    xlim (pair of float or None)
+        The visible time range. The whole waveform is decimated when None.
+
+    Returns a tuple of numpy arrays (time, samples).
+    '''
+    if xlim is None:
+        return _decimate(t, wf, target)
+
+    # Keep one sample of margin so the trace extends to the edges of the view
+    lo = max(np.searchsorted(t, xlim[0], 'left') - 1, 0)
+    hi = min(np.searchsorted(t, xlim[1], 'right') + 1, len(t))
+
+    parts = [_decimate(t[a:b], wf[a:b], target) for a, b in ((0, lo), (lo, hi), (hi, len(t)))]
+
+    return (np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]))
+
+
+def _rect_collection(bounds, colors):
+    '''Create a collection of filled rectangles
+
+    bounds (sequence of (float, float, float, float))
+        The (start, end, bottom, top) bounds of each rectangle
+
+    colors (sequence of RGBA tuples)
+        Fill color of each rectangle
+
+    Returns a PolyCollection.
+    '''
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+
+    # Corners are (start, bottom), (end, bottom), (end, top), (start, top)
+    verts = np.empty((len(bounds), 4, 2))
+    verts[:, 0::3, 0] = bounds[:, 0, np.newaxis]
+    verts[:, 1:3, 0] = bounds[:, 1, np.newaxis]
+    verts[:, 0:2, 1] = bounds[:, 2, np.newaxis]
+    verts[:, 2:4, 1] = bounds[:, 3, np.newaxis]
+
+    # An (N, 4) array of RGBA values is used by matplotlib without converting each color
+    colors = np.asarray(colors, dtype=float).reshape(-1, 4)
+
+    return PolyCollection(verts, facecolors=colors, edgecolors='none', linewidths=0)
+
+
 class Plotter(object):
     '''Manage annotated waveform plotting'''
     def __init__(self):
         self.fig = None
         self.axes = None
         self.data_ix = 0
+        self._vector_cache = {} # (stream, vectors) keyed by stream id
+        self._time_cache = {} # Shared time vectors keyed by (start time, sample period, count)
+        self._ann_bounds = None
+        self._ann_artists = [] # Artists drawn by annotate()
+        self._style_rgba = None # Annotation fill colors keyed by style name
+
+    def channel_vectors(self, s_stream):
+        '''Get the samples and time vector of a channel
+
+        The result is cached for iterator streams so that a channel can be
+        plotted again after its iterator is exhausted. Re-iterable streams such
+        as lists are extracted on every call since they may have been changed.
+        plot() only keeps the cache entries for the channels it last plotted.
+
+        s_stream (iterable of SampleChunk objects)
+            The sample stream to extract samples from.
+
+        Returns a tuple of numpy arrays (samples, time).
+        '''
+        if iter(s_stream) is not s_stream: # Not an iterator
+            return _sample_vectors(s_stream, self._time_cache)
+
+        key = id(s_stream)
+        try:
+            return self._vector_cache[key][1]
+        except KeyError:
+            vectors = _sample_vectors(s_stream, self._time_cache)
+            # Keep a reference to the stream so that its id can't be reused
+            self._vector_cache[key] = (s_stream, vectors)
+            return vectors
 
     def waveform_bounds(self, raw_samples):
         '''Retrieve the y-axis boundaries for annotation elements'''
-        max_wf = max(raw_samples)
-        min_wf = min(raw_samples)
+        raw_samples = np.asarray(raw_samples)
+        max_wf = raw_samples.max()
+        min_wf = raw_samples.min()
         span = max_wf - min_wf
+        if span == 0: # Constant waveform; keep the overlay from collapsing onto it
+            span = max(abs(max_wf), 1.0) * 0.1
         
         # Overlay bounds
         ovl_top = max_wf + span * 0.15
@@ -97,12 +292,13 @@ class Plotter(object):
             'min': min_wf,
             'ovl_top': ovl_top,
             'ovl_bot': ovl_bot,
+            'span': span,
         }
         
         return bounds
 
     def plot(self, channels, annotations=None, title='', label_format=stream.AnnotationFormat.Int, show_names=False, \
-            ylim=None, xlim=None):
+            ylim=None, xlim=None, max_points=None, figsize=None, cull=False, reuse_figure=False):
         '''Plot annotated waveform data
 
         channels (dict of string:sample stream)
@@ -128,16 +324,55 @@ class Plotter(object):
         xlim (pair of float or None)
             Set lower and upper bound for the x-axis
 
+        max_points (int or None)
+            Waveforms with more samples than this are reduced to the min and max of
+            max_points / 2 bins before plotting. It must be at least 2. With xlim
+            the bins are sized to the samples within it. Every sample is plotted
+            when None. Reduction speeds up plots that are saved to a file but
+            zooming into an interactive plot will show the reduced waveform.
+
+        figsize ((number,number) or None)
+            The (x,y) dimensions of the figure in inches. Matplotlib uses 100DPI.
+
+        cull (bool)
+            Only create annotations that lie within the x-axis range. This speeds up
+            plots that are saved to a file but panning or zooming out of an
+            interactive plot will show a blank annotation area beyond the range.
+
+        reuse_figure (bool)
+            Clear and redraw the figure from the previous call when it is still open
+            and has the same number of channels. This saves the figure setup cost
+            when rendering many plots but the previous plot is no longer available.
+            The figure keeps its current size unless figsize is given. A new figure
+            is created for each call when False.
         '''
 
-        # Get raw samples and time vectors from channel streams
-        vectors = {}
-        for k in channels.keys():
-            wf, start_time, sample_period = stream.extract_all_samples(channels[k])
-            t = np.arange(start_time, start_time + len(wf) * sample_period - (sample_period / 2), sample_period)
-            vectors[k] = (wf, t)
+        if max_points is not None and max_points < 2:
+            raise ValueError('max_points must be at least 2')
 
-        self.fig, self.axes = plt.subplots(len(channels), 1, sharex=True, sharey=True)
+        # Get raw samples and time vectors from channel streams
+        chan_names = list(channels.keys())
+        self._time_cache = {}
+        vectors = dict((k, self.channel_vectors(channels[k])) for k in chan_names)
+
+        # Drop cached vectors of streams that aren't part of this plot
+        chan_ids = set(id(channels[k]) for k in chan_names)
+        self._vector_cache = dict((key, v) for key, v in self._vector_cache.items() if key in chan_ids)
+
+        # pyplot is imported on first use so that importing this module doesn't
+        # select a backend and callers can still choose one with matplotlib.use()
+        import matplotlib.pyplot as plt
+
+        n_chan = len(chan_names)
+        if reuse_figure and self.fig is not None and len(self.axes) == n_chan \
+            and hasattr(self.fig, 'subplots') and plt.fignum_exists(self.fig.number):
+            # Reuse the open figure from a previous call to skip the figure setup cost
+            self.fig.clear()
+            if figsize is not None:
+                self.fig.set_size_inches(figsize)
+            self.axes = self.fig.subplots(n_chan, 1, sharex=True, sharey=True)
+        else:
+            self.fig, self.axes = plt.subplots(n_chan, 1, sharex=True, sharey=True, figsize=figsize)
 
         if not hasattr(self.axes, '__len__'):
             self.axes = (self.axes,)
@@ -145,28 +380,29 @@ class Plotter(object):
         #print('$$$ axes:', self.axes)
 
         # Plot waveforms
-        for i, (ax, k) in enumerate(zip(self.axes, channels.keys())):
+        plotted_wf = {}
+        for i, (ax, k) in enumerate(zip(self.axes, chan_names)):
             color_ix = (i - len(self.axes) + 1) % len(plot_colors)
             color = plot_colors[color_ix]
             #print('### plotting:', color, len(vectors[k][1]), len(vectors[k][0]))
-            ax.plot(vectors[k][1], vectors[k][0], color=color)
+            wf, t = vectors[k]
+            if max_points is not None:
+                t, wf = _decimate_view(t, wf, max_points // 2, xlim)
+            ax.plot(t, wf, color=color)
+            plotted_wf[k] = wf
             ax.set_ylabel(k)
 
         self.axes[0].set_title(title)
         self.axes[-1].set_xlabel('Time (s)')
 
 
-        # Draw annotation rectangles
-        ann_chan = channels.keys()[-1]
-        ann_ax = self.axes[-1]
+        # Set axis limits from the channel carrying the annotations
+        ann_chan = chan_names[-1]
 
-        ann_b = self.waveform_bounds(vectors[ann_chan][0])
-        text_ypos = (ann_b['max'] + ann_b['ovl_top']) / 2.0 #FIX: this needs to be more adaptable
-
-        if show_names:
-            name_ypos = (text_ypos + ann_b['max']) / 2.0
-        else:
-            name_ypos = None
+        # Decimation keeps the extreme samples so the bounds can be found from
+        # the plotted waveform without scanning every sample again
+        ann_b = self.waveform_bounds(plotted_wf[ann_chan])
+        self._ann_bounds = ann_b
 
         if ylim is None:
             self.axes[-1].set_ylim(ann_b['ovl_bot'] * 1.05, ann_b['ovl_top'] * 1.05)
@@ -179,29 +415,106 @@ class Plotter(object):
             self.axes[-1].set_xlim(xlim[0], xlim[1])
 
 
-
+        self._ann_artists = []
         if annotations is not None:
-            for a in annotations:
-                if not isinstance(a, stream.StreamRecord):
-                    continue
-
-                self.data_ix = 0
-                self._plot_patches(a, ann_b, ann_ax)
-
-                # Draw annotation text
-                self._draw_text(a, text_ypos, ann_ax, label_format, name_ypos)
+            self._draw_annotations(annotations, label_format, show_names, cull)
 
         self.fig.tight_layout()
         self.fig.subplots_adjust(bottom=0.12)
 
 
 
+    def annotate(self, annotations, label_format=stream.AnnotationFormat.Int, show_names=False, cull=False):
+        '''Draw annotations over the last channel of the plot
+
+        Any annotations drawn previously are replaced. The waveforms from the last
+        call to plot() are kept so that new decoder output can be shown without
+        extracting and plotting the samples again.
+
+        annotations (sequence of StreamRecord)
+            The annotation data produced by a protocol decoder
+
+        label_format (AnnotationFormat)
+            data format to apply for annotation records with a data_format attribute
+            equal to AnnotationFormat.General
+
+        show_names (bool)
+            Show the field names for each annotation value
+
+        cull (bool)
+            Only create annotations that lie within the x-axis range. This speeds up
+            plots that are saved to a file but panning or zooming out of an
+            interactive plot will show a blank annotation area beyond the range.
+        '''
+        if self.fig is None:
+            return
+
+        for artist in self._ann_artists:
+            artist.remove()
+        self._ann_artists = []
+
+        self._draw_annotations(annotations, label_format, show_names, cull)
+
+        # Refresh an interactive window
+        self.fig.canvas.draw_idle()
+
+
+    def _draw_annotations(self, annotations, label_format, show_names, cull):
+        '''Add annotation rectangles and labels to the last axes'''
+        ann_ax = self.axes[-1]
+        ann_b = self._ann_bounds
+        text_ypos = (ann_b['max'] + ann_b['ovl_top']) / 2.0 #FIX: this needs to be more adaptable
+
+        if show_names:
+            name_ypos = (text_ypos + ann_b['max']) / 2.0
+        else:
+            name_ypos = None
+
+        # Vertical extent of the top level annotation rectangles and the
+        # inset extent of all nested rectangles
+        frame_y = (ann_b['ovl_bot'], ann_b['ovl_top'])
+        span = ann_b['span']
+        inset_y = (ann_b['min'] - span * 0.01, ann_b['max'] + span * 0.01)
+
+        rects = ([], []) # Rectangle bounds and colors
+        labels = []
+        self._style_rgba = _style_fill_colors()
+
+        # When culling, skip records lying entirely outside the visible time range.
+        # Their subrecords fall within their bounds so they are not visible either.
+        if cull:
+            x_lo, x_hi = ann_ax.get_xlim()
+        else:
+            x_lo, x_hi = -np.inf, np.inf
+
+        records = [a for a in annotations if isinstance(a, stream.StreamRecord) and \
+            not (hasattr(a, 'start_time') and (a.end_time < x_lo or a.start_time > x_hi))]
+        for a in records:
+            self.data_ix = 0
+            self._plot_patches(a, frame_y, inset_y, rects)
+
+            # Collect annotation text
+            self._draw_text(a, text_ypos, labels, label_format, name_ypos)
+
+        # Add all rectangles at once. This is much faster than adding them individually.
+        # The axis limits are set explicitly so the data limits don't need updating.
+        self._ann_artists.append(ann_ax.add_collection(_rect_collection(*rects), autolim=False))
+
+        # Text is the most expensive element to render. When culling, only
+        # create labels centered within the visible time range.
+        text_props = _label_text_props()
+        for x, y, label, style_name in labels:
+            if x_lo <= x <= x_hi:
+                self._ann_artists.append(ann_ax.text(x, y, label, **text_props[style_name]))
+
+
     def show(self):
         '''Show the result of plot() in an interactive window'''
         if self.fig is not None:
+            import matplotlib.pyplot as plt
             plt.show()
 
-    def save_plot(self, fname, figsize=None):
+    def save_plot(self, fname, figsize=None, simplify_threshold=None):
         '''Save the result of plot() to a file
 
         fname (string)
@@ -209,15 +522,39 @@ class Plotter(object):
 
         figsize ((number,number))
             The (x,y) dimensions of the image in inches. Matplotlib uses 100DPI.
+            Passing figsize to plot() instead avoids redoing the layout.
+
+        simplify_threshold (float or None)
+            Line segments that deviate less than this many pixels from a straight
+            line are merged when rendering. 1.0 gives the fastest rendering of
+            long waveforms at the cost of flattening small scale noise. When
+            None the matplotlib path.simplify_threshold setting is used.
         '''
         if self.fig is not None:
             if figsize is not None:
                 self.fig.set_size_inches(figsize)
-            self.fig.savefig(fname)
 
+            if simplify_threshold is None:
+                self.fig.savefig(fname)
+            else:
+                render_params = {'path.simplify': True, 'path.simplify_threshold': simplify_threshold}
+                with matplotlib.rc_context(render_params):
+                    self.fig.savefig(fname)
+
+
+    def _plot_patches(self, a, rect_y, inset_y, rects):
+        '''Recursively generate colored rectangles for annotations
+
+        rect_y ((float, float))
+            The (bottom, top) of the rectangle for this record
 
-    def _plot_patches(self, a, ann_b, ann_ax):
-        '''Recursively generate colored rectangles for annotations'''
+        inset_y ((float, float))
+            The (bottom, top) of the rectangles for subrecords
+
+        rects (pair of lists)
+            The (start, end, bottom, top) bounds and the RGBA color of each
+            rectangle are appended to the first and second list respectively.
+        '''
 
         if not hasattr(a, 'start_time'): # Not a stream segment
             return
@@ -225,45 +562,30 @@ class Plotter(object):
         if a.data_format != stream.AnnotationFormat.Invisible:
             p_start = a.start_time
             p_end = a.end_time
-            bot = ann_b['ovl_bot']
-            width = p_end - p_start
-            height = ann_b['ovl_top'] - bot
+            bot, top = rect_y
 
             style = a.style
+            color = self._style_rgba.get(style, _default_fill_color)
             if style == 'data':
-                style = 'data{}'.format(self.data_ix)
+                color = color[self.data_ix]
                 self.data_ix = 1 - self.data_ix
 
-            elif style == 'check':
-                style = 'check_good' if a.status == stream.StreamStatus.Ok else 'check_bad'
-
-            elif style == 'ack':
-                style = 'ack_good' if a.status == stream.StreamStatus.Ok else 'ack_bad'
+            elif style in _variant_styles:
+                color = color[0] if a.status == stream.StreamStatus.Ok else color[1]
 
-            if style in annotation_styles:
-                color = annotation_styles[style].color
-                alpha = annotation_styles[style].alpha
-
-            else: # Default
-                color = 'red'
-                alpha = 0.2
-
-            p_rect = patches.Rectangle((p_start, bot), width, height, facecolor=color, alpha=alpha)
-            ann_ax.add_patch(p_rect)
-
-        inset_b = ann_b.copy()
-        span = inset_b['max'] - inset_b['min']
-        inset_b['ovl_top'] = inset_b['max'] + span * 0.01
-        inset_b['ovl_bot'] = inset_b['min'] - span * 0.01
-
-        #print('$$$$ overlay:', ann_b['ovl_top'], inset_b['ovl_top'], ann_b['i_ovl_top'])
+            rects[0].append((p_start, p_end, bot, top))
+            rects[1].append(color)
 
         for sr in a.subrecords:
-            self._plot_patches(sr, inset_b, ann_ax)
+            self._plot_patches(sr, inset_y, inset_y, rects)
 
 
-    def _draw_text(self, a, text_ypos, ann_ax, label_format, name_ypos=None):
-        '''Recursively generate text labels'''
+    def _draw_text(self, a, text_ypos, labels, label_format, name_ypos=None):
+        '''Recursively generate text labels
+
+        Each label is appended to the labels list as a tuple
+        (x, y, text, label style name). Field name labels have a style name of None.
+        '''
         if 'value' in a.fields:
             label = a.fields['value']
         else:
@@ -303,13 +625,7 @@ class Plotter(object):
                 label_style_name = 'normal'
 
             #print('## style name:', label_style_name, label_format, a.data_format, applied_format, label)
-            ls = label_styles[label_style_name]
-
-            weight = 'bold' if ls.bold else 'normal'
-            style = 'italic' if ls.italic else 'normal'
-            ann_ax.text((a.start_time + a.end_time) / 2.0, text_ypos, label, \
-                size=ls.size, ha='center', color=ls.color, rotation=ls.angle, \
-                weight=weight, style=style)
+            labels.append(((a.start_time + a.end_time) / 2.0, text_ypos, label, label_style_name))
 
             if name_ypos:
                 try:
@@ -318,12 +634,11 @@ class Plotter(object):
                     name = a.kind
 
                 if len(name) > 0:
-                    ann_ax.text((a.start_time + a.end_time) / 2.0, name_ypos, name, \
-                        size='small', ha='center', color='0.4')
+                    labels.append(((a.start_time + a.end_time) / 2.0, name_ypos, name, None))
         
 
         for sr in a.subrecords:
-            self._draw_text(sr, text_ypos, ann_ax, label_format, name_ypos)
+            self._draw_text(sr, text_ypos, labels, label_format, name_ypos)
 
 based_literal = re.compile('^(\d{1,2})#([^#]+)#$')
 
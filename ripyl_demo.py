@@ -79,6 +79,10 @@ Supported protocols:
     if not matplotlib_exists:
         options.no_plot = True
 
+    if not options.no_plot and options.save_file is not None:
+        # No window is needed when only saving to a file
+        matplotlib.use('Agg')
+
     # process dropout parameters
     if options.dropout is not None:
         do_opts = [float(n) for n in options.dropout.split(',')]
@@ -1455,10 +1459,15 @@ def plot_channels(channels, annotations, options, plot_params, sample_points=Non
             xlim = None
 
 
+        # Reduce waveform detail and skip offscreen annotations only when saving an image.
+        # An interactive plot needs them when zooming and panning.
+        saving = options.save_file is not None
+        max_points = 8000 if saving else None
+
         plotter = rplot.Plotter()
         annotations = None if options.no_annotation else annotations
         plotter.plot(channels, annotations, title, label_format=plot_params['label_format'], show_names=options.show_names, \
-            ylim=ylim, xlim=xlim)
+            ylim=ylim, xlim=xlim, max_points=max_points, figsize=options.figsize, cull=saving)
 
         if sample_points is not None:
             # Each sample point is a pair with the first element being the start of the bit
@@ -1476,7 +1485,7 @@ def plot_channels(channels, annotations, options, plot_params, sample_points=Non
         if options.save_file is None:
             plotter.show()
         else:
-            plotter.save_plot(options.save_file, options.figsize)
+            plotter.save_plot(options.save_file)
 
 def report_results(decoded_recs, orig_messages, protocol_params, wave_params, decode_success, extract_func=None):
 
@@ -168,7 +168,7 @@ setup(name='ripyl',
     long_description=long_description,
     install_requires = ['scipy >= 0.11.0', 'numpy >= 1.7.0'],
     packages = ['ripyl', 'ripyl.protocol', 'ripyl.protocol.infrared', 'ripyl.util',
-                'ripyl.cython', 'ripyl.cython.util'],
+                'ripyl.cython', 'ripyl.cython.util', 'ripyl.cython.protocol'],
     py_modules = ['ripyl_demo'],
     cmdclass = cmdclass,
     #ext_modules = extensions,
@@ -33,6 +33,21 @@ import ripyl.sigproc as sigp
 import ripyl.streaming as streaming
 import test.test_support as tsup
 
+class _Reserved7bTransfer(i2c.I2CTransfer):
+    '''Transfer that sends any address in 7-bit form
+
+    I2CTransfer sends addresses above 0x77 as 10-bit addresses.
+    '''
+    def bytes(self):
+        return [(self.address << 1) | (self.r_wn & 0x01)] + list(self.data)
+
+    def ack_bits(self):
+        ack = [0] * (len(self.data) + 1)
+        if self.r_wn == i2c.I2C.Read:
+            ack[-1] = 1 # Master nacks last byte of a read
+        return ack
+
+
 class TestI2CFuncs(tsup.RandomSeededTestCase):
 
     def test_i2c_decode(self):
@@ -95,3 +110,75 @@ class TestI2CFuncs(tsup.RandomSeededTestCase):
             self.assertTrue(match, msg='Transfers not decoded successfully')
             self.assertEqual(len(d_txfers), len(transfers), 'Missing or extra decoded transfers')
                 
+
+    def test_i2c_reserved_7b_address(self):
+        self.test_name = 'I2C reserved 7-bit address'
+        self.trial_count = 8
+        # 7-bit addresses 0x7C-0x7F don't match the 11110XX prefix of a 10-bit address
+        for i, (addr, r_wn) in enumerate([(a, rw) for a in xrange(0x7C, 0x80) for rw in (i2c.I2C.Write, i2c.I2C.Read)]):
+            self.update_progress(i+1)
+
+            data = [random.randint(0, 255) for _ in xrange(random.randint(1, 4))]
+            transfers = [_Reserved7bTransfer(r_wn, addr, data)]
+
+            scl, sda = i2c.i2c_synth(transfers, 100.0e3, idle_start=3.0e-5, idle_end=3.0e-5)
+            records = list(i2c.i2c_decode(scl, sda, stream_type=streaming.StreamType.Edges))
+
+            addr_recs = [r for r in records if isinstance(r, i2c.I2CAddress)]
+            self.assertEqual(len(addr_recs), 1, 'Missing or extra address records')
+            self.assertEqual(addr_recs[0].data, addr, 'Wrong address decoded')
+            self.assertEqual(addr_recs[0].r_wn, r_wn, 'Wrong r_wn decoded')
+            self.assertEqual(len(addr_recs[0].subrecords), 2, 'Address decoded as 10-bit')
+
+            d_txfers = list(i2c.reconstruct_i2c_transfers(iter(records)))
+            self.assertEqual(len(d_txfers), 1, 'Missing or extra decoded transfers')
+            self.assertEqual(d_txfers[0].address, addr, 'Wrong transfer address')
+            self.assertEqual(d_txfers[0].data, data, 'Wrong transfer data')
+
+
+    def test_i2c_decode_batches(self):
+        self.test_name = 'I2C batch decode'
+        self.trial_count = 20
+        for i in xrange(self.trial_count):
+            self.update_progress(i+1)
+
+            clock_freq = 100.0e3
+
+            transfers = []
+            for _ in xrange(random.randint(1, 6)):
+                addr = random.randint(1, 0x77)
+                data = [random.randint(0, 255) for __ in xrange(random.randint(1, 10))]
+                transfers.append(i2c.I2CTransfer(i2c.I2C.Write, addr, data))
+
+            scl, sda = i2c.i2c_synth(transfers, clock_freq, idle_start=3.0e-5, idle_end=3.0e-5)
+            scl = list(scl)
+            sda = list(sda)
+
+            batches = list(i2c.i2c_decode_batches(iter(scl), iter(sda), stream_type=streaming.StreamType.Edges))
+
+            # Raw data column matches the transferred bytes without creating records
+            data_bytes = []
+            for b in batches:
+                data_bytes.extend(b.data[b.kind == i2c.I2CRecordKind.Data].tolist())
+
+            self.assertEqual(data_bytes, [d for t in transfers for d in t.data], 'Batch data column mismatch')
+
+            # Bus condition rows have zero data and ACK columns
+            cond_data = []
+            cond_acks = []
+            for b in batches:
+                conds = b.kind <= i2c.I2CRecordKind.Stop
+                cond_data.extend(b.data[conds].tolist())
+                cond_acks.extend(b.columns['ack_bit'][conds].tolist())
+
+            self.assertEqual(len(cond_data), len(transfers) + 1, 'Missing bus condition rows')
+            self.assertEqual(cond_data, [0] * len(cond_data), 'Bus condition data not zero')
+            self.assertEqual(cond_acks, [0] * len(cond_acks), 'Bus condition ACK not zero')
+
+            # Iterating the batches produces the same records as i2c_decode()
+            batch_records = [r for b in batches for r in b]
+            records = list(i2c.i2c_decode(iter(scl), iter(sda), stream_type=streaming.StreamType.Edges))
+
+            self.assertEqual(len(batch_records), len(records), 'Batch record count mismatch')
+            for br, r in zip(batch_records, records):
+                self.assertEqual(br, r, 'Batch record mismatch')
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''Ripyl protocol decode library
+   plot.py test suite
+'''
+
+# Copyright © 2013 Kevin Thibedeau
+
+# This file is part of Ripyl.
+
+# Ripyl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+
+# Ripyl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with Ripyl. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function, division
+
+import unittest
+import random
+
+import numpy as np
+
+try:
+    import matplotlib
+    matplotlib_exists = True
+except ImportError:
+    matplotlib_exists = False
+
+if matplotlib_exists:
+    import ripyl.util.plot as rplot
+
+import test.test_support as tsup
+
+
+def _random_waveform(count):
+    t = np.arange(count) * 1.0e-6
+    if random.random() < 0.2: # Constant waveform
+        wf = np.ones(count) * random.uniform(-5.0, 5.0)
+    else:
+        wf = np.random.uniform(-5.0, 5.0, count)
+
+    return (t, wf)
+
+
+@unittest.skipIf(not matplotlib_exists, 'matplotlib not installed')
+class TestPlotFuncs(tsup.RandomSeededTestCase):
+
+    def setUp(self):
+        super(TestPlotFuncs, self).setUp()
+        np.random.seed(random.randint(0, 2**31))
+
+    def check_envelope(self, t, wf, d_t, d_wf, start=0, end=None):
+        '''Check that the decimated samples within [start, end) keep the min and max of each bin'''
+        if end is None:
+            end = len(wf)
+
+        # Samples are kept in order and unchanged. A bin's min and max can be the same sample.
+        ix = np.round(d_t / 1.0e-6).astype(int)
+        self.assertTrue((np.diff(ix) >= 0).all(), 'Decimated samples out of order')
+        self.assertTrue((d_wf == wf[ix]).all(), 'Decimated samples changed')
+
+        ix = ix[(ix >= start) & (ix < end)]
+        count = end - start
+        stride = count // self.target
+        if stride < 2:
+            self.assertEqual(len(ix), count, 'Samples removed from short waveform')
+            return
+
+        for b in xrange(count // stride):
+            lo = start + b * stride
+            b_wf = wf[lo:lo + stride]
+            kept = wf[ix[(ix >= lo) & (ix < lo + stride)]]
+            self.assertEqual(kept.min(), b_wf.min(), 'Bin minimum not kept')
+            self.assertEqual(kept.max(), b_wf.max(), 'Bin maximum not kept')
+
+        # Leftover samples past the last bin are all kept
+        leftover = ix[ix >= start + (count // stride) * stride]
+        self.assertEqual(len(leftover), count % stride, 'Leftover samples removed')
+
+    def test_decimate(self):
+        self.test_name = 'decimate test'
+        self.trial_count = 100
+        for i in xrange(self.trial_count):
+            self.update_progress(i+1)
+
+            self.target = random.randint(1, 100)
+            t, wf = _random_waveform(random.randint(0, 2000))
+
+            d_t, d_wf = rplot._decimate(t, wf, self.target)
+            self.check_envelope(t, wf, d_t, d_wf)
+
+            if len(wf) < 2 * self.target: # Fewer than two samples per bin
+                self.assertTrue(d_t is t and d_wf is wf, 'Short waveform not passed through')
+
+    def test_decimate_view(self):
+        self.test_name = 'decimate_view test'
+        self.trial_count = 100
+        for i in xrange(self.trial_count):
+            self.update_progress(i+1)
+
+            self.target = random.randint(1, 100)
+            count = random.randint(1, 2000)
+            t, wf = _random_waveform(count)
+
+            xlim = sorted(random.uniform(-0.1, 1.1) * t[-1] for _ in xrange(2))
+            d_t, d_wf = rplot._decimate_view(t, wf, self.target, xlim)
+
+            # The visible samples plus one sample of margin are decimated on their own
+            start = max(np.searchsorted(t, xlim[0], 'left') - 1, 0)
+            end = min(np.searchsorted(t, xlim[1], 'right') + 1, count)
+            self.check_envelope(t, wf, d_t, d_wf, start, end)
+
+            # The samples outside the view are kept in their own bins
+            self.check_envelope(t, wf, d_t, d_wf, 0, start)
+            self.check_envelope(t, wf, d_t, d_wf, end, count)
+
+            # Without a view this is the same as decimating everything
+            n_t, n_wf = rplot._decimate_view(t, wf, self.target)
+            r_t, r_wf = rplot._decimate(t, wf, self.target)
+            self.assertTrue((n_t == r_t).all() and (n_wf == r_wf).all(), 'Full view mismatch')